@@ -54,6 +54,15 @@ def get_config_value(arg_value, env_file_value):
         return arg_value
     return env_file_value
 
+def get_switch_name(env_file, env_vars):
+    """スイッチ名を取得: SWITCH_NAME > .envファイル名（.env.office-floor1 -> office-floor1） > SWITCH_IP"""
+    if env_vars.get('SWITCH_NAME'):
+        return env_vars['SWITCH_NAME']
+    basename = os.path.basename(env_file)
+    if basename.startswith('.env.'):
+        return basename[len('.env.'):]
+    return env_vars.get('SWITCH_IP')
+
 def print_summary(result):
     """スイッチ情報の概要を表示"""
     print("=" * 70)
@@ -156,7 +165,7 @@ AVAILABLE_COMMANDS = {
     'main': [('home_main', 'スイッチ基本情報')],
 }
 
-def get_switch_data_with_retry(switch_url, username, password, commands_to_fetch, get_all_port_traffic=False, max_retries=2, initial_retry_delay=1):
+def get_switch_data_with_retry(switch_url, username, password, commands_to_fetch, get_all_port_traffic=False, max_retries=2, initial_retry_delay=1, traffic_ports=None):
     """リトライ機能付きでスイッチにログインして指定された情報を取得
     
     注意: スイッチは前回のセッションを完全に解放するまでに時間がかかるため、
@@ -166,6 +175,8 @@ def get_switch_data_with_retry(switch_url, username, password, commands_to_fetch
     - 1回目の失敗: 1秒待機
     - 2回目の失敗: 2秒待機
     - 3回目の失敗: 4秒待機
+    
+    traffic_portsを指定した場合は、そのポートのトラフィック統計のみ取得する。
     """
     
     # 最初の試行前に既存セッションを切断
@@ -177,7 +188,7 @@ def get_switch_data_with_retry(switch_url, username, password, commands_to_fetch
     
     for attempt in range(max_retries):
         try:
-            result = get_switch_data(switch_url, username, password, commands_to_fetch, get_all_port_traffic)
+            result = get_switch_data(switch_url, username, password, commands_to_fetch, get_all_port_traffic, traffic_ports)
             
             # エラーがある場合はリトライ
             if "error" in result:
@@ -218,8 +229,11 @@ def disconnect_existing_session(switch_url):
     except:
         pass
 
-def get_switch_data(switch_url, username, password, commands_to_fetch, get_all_port_traffic=False):
-    """スイッチにログインして指定された情報を取得"""
+def get_switch_data(switch_url, username, password, commands_to_fetch, get_all_port_traffic=False, traffic_ports=None):
+    """スイッチにログインして指定された情報を取得
+    
+    traffic_portsを指定した場合は、そのポートのトラフィック統計のみ取得する（省略時は全ポート）。
+    """
     
     cookie_jar = http.cookiejar.CookieJar()
     opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookie_jar))
@@ -346,7 +360,7 @@ def get_switch_data(switch_url, username, password, commands_to_fetch, get_all_p
             result['port_traffic_all'] = {}
             
             # 各ポートの統計を取得（home.htmlからの参照を維持）
-            for port in PORTS:
+            for port in (PORTS if traffic_ports is None else traffic_ports):
                 api_url = f"{switch_url}/cgi/get.cgi?cmd=port_cnt&port={port}&dummy={int(time.time() * 1000)}"
                 
                 request = urllib.request.Request(api_url)
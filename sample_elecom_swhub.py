@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+スイッチングハブ 適応型サンプリングスクリプト
+
+panel_info / mac_dynamic / port_cnt（ポートごと）を系列として扱い、
+系列ごとにポーリング間隔を調整しながら取得する。
+
+- 値が変化した系列（通信中のポート、リンク状態の変化など）は最短間隔に戻す
+- 変化のない系列（アイドル・ダウンしたポート、変化のないテーブル）は
+  間隔を指数的に延ばす（最長 max_interval 秒）
+- panel_info でリンク状態が変化したポートは、port_cnt も次の取得で最短間隔に戻す
+
+次回の取得時刻は取得開始時刻から数え、min_interval 刻みの共通の時刻に揃える。
+期限が近い系列（min_interval/2 以内）は同じセッションでまとめて取得するため、
+取得が min_interval 以内に終わる限り、ログイン・ログアウトを含めた
+セッション数・リクエスト数とも全系列を min_interval で固定ポーリングする
+場合を超えない。さらに max_requests で1回の取得あたりのリクエスト数に
+上限を設けられる（持ち越した系列は次の取得に回るため、この場合は
+セッション数が増えることがある）。
+
+出力は watch_elecom_swhub_alerts.py --replay で読める JSON Lines 形式
+（{"switch": 名前, "time": UNIX時刻, "result": 取得結果}）。
+
+使用方法:
+  python3 sample_elecom_swhub.py [オプション]
+
+例:
+  python3 sample_elecom_swhub.py --env-file .env.office-floor1 > samples.jsonl
+  python3 sample_elecom_swhub.py --env-file .env.office-floor1 --traffic --max-interval 30 --stats 60
+"""
+
+import collections
+import json
+import time
+import argparse
+import sys
+
+from get_elecom_swhub_info import (
+    PORTS,
+    load_env_file,
+    get_config_value,
+    get_switch_name,
+    get_switch_data_with_retry,
+)
+
+# 適応的にサンプリングできるコマンド（port_cntはポートごとの系列）
+SAMPLED_COMMANDS = ['panel_info', 'mac_dynamic']
+
+
+def _fingerprint(data):
+    """変化検知用に取得データを正規化した文字列にする"""
+    return json.dumps(data, sort_keys=True)
+
+
+class AdaptiveSampler:
+    """系列ごとのポーリング間隔を管理する
+
+    系列名は 'panel_info'、'mac_dynamic'、'port_cnt:GE1' のような文字列。
+    due() で今回取得すべきコマンドとポートを受け取り、取得結果を update() に渡す。
+    """
+
+    def __init__(self, commands, ports, min_interval=1.0, max_interval=60.0, backoff=2.0,
+                 max_requests=None, rate_window=60.0, now=None):
+        if now is None:
+            now = time.time()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_requests = max_requests
+        self.rate_window = rate_window
+        self.started = now
+        # 次回取得時刻を揃える基準（started + k * min_interval）
+        self._origin = now
+        # 系列名 -> {'interval', 'next_due', 'fingerprint', 'samples'}
+        self.series = {}
+        for name in list(commands) + [f"port_cnt:{port}" for port in ports]:
+            self.series[name] = {
+                'interval': min_interval,
+                'next_due': now,
+                'fingerprint': None,
+                'samples': collections.deque(),
+            }
+        # panel_info から得たポートごとのリンク状態
+        self._linkup = {}
+        # 直近の due() で取得対象とした系列
+        self._requested = []
+
+    def _align(self, t):
+        """時刻を min_interval 刻みの共通の時刻に揃える"""
+        return self._origin + round((t - self._origin) / self.min_interval) * self.min_interval
+
+    def due(self, now):
+        """取得期限に達した系列を (コマンド一覧, ポート一覧) で返す
+
+        期限まで min_interval/2 以内の系列も同じセッションで取得する。
+        max_requests を超える場合は期限超過の大きい系列を優先し、
+        残りは次回に持ち越す。
+        """
+        horizon = now + self.min_interval / 2
+        names = [name for name, state in self.series.items() if state['next_due'] <= horizon]
+        names.sort(key=lambda name: self.series[name]['next_due'])
+        if self.max_requests is not None:
+            names = names[:self.max_requests]
+        self._requested = names
+        commands = [name for name in names if not name.startswith('port_cnt:')]
+        ports = [name[len('port_cnt:'):] for name in names if name.startswith('port_cnt:')]
+        return commands, ports
+
+    def next_due(self):
+        """次に取得期限が来る時刻（系列がなければNone）"""
+        if not self.series:
+            return None
+        return min(state['next_due'] for state in self.series.values())
+
+    def _record(self, samples, now):
+        """サンプル時刻を記録し、rate_window より古いものを捨てる"""
+        samples.append(now)
+        while samples and samples[0] <= now - self.rate_window:
+            samples.popleft()
+
+    def _observe(self, name, data, started):
+        state = self.series.get(name)
+        if state is None:
+            return
+        if not isinstance(data, dict) or 'error' in data:
+            # 取得失敗時は間隔を変えずに再試行する（実効レートには数えない）
+            state['next_due'] = self._align(started + state['interval'])
+            return
+        self._record(state['samples'], started)
+        fingerprint = _fingerprint(data)
+        if state['fingerprint'] is not None and fingerprint == state['fingerprint']:
+            state['interval'] = min(state['interval'] * self.backoff, self.max_interval)
+        else:
+            state['interval'] = self.min_interval
+        state['fingerprint'] = fingerprint
+        state['next_due'] = self._align(started + state['interval'])
+
+    def _snap(self, name, started):
+        """系列を最短間隔に戻して次の刻みで取得対象にする"""
+        state = self.series.get(name)
+        if state is not None:
+            state['interval'] = self.min_interval
+            state['next_due'] = min(state['next_due'], self._align(started + self.min_interval))
+
+    def update(self, result, started=None):
+        """取得結果を反映して各系列の次回取得時刻を決める
+
+        started は取得を開始した時刻（固定間隔ポーリングと同じく開始時刻から数える）。
+        """
+        if started is None:
+            started = time.time()
+        observed = set()
+        for cmd in SAMPLED_COMMANDS:
+            if cmd in result:
+                self._observe(cmd, result[cmd], started)
+                observed.add(cmd)
+        for port, data in result.get('port_traffic_all', {}).items():
+            self._observe(f"port_cnt:{port}", data, started)
+            observed.add(f"port_cnt:{port}")
+
+        # 取得全体が失敗した場合（{"error": ...} のみ）も間隔を空けてから再試行する
+        for name in self._requested:
+            if name not in observed and name in self.series:
+                state = self.series[name]
+                state['next_due'] = self._align(started + state['interval'])
+        self._requested = []
+
+        # リンク状態が変化したポートのカウンタを次の取得で取り直す
+        panel_info = result.get('panel_info')
+        if isinstance(panel_info, dict) and 'error' not in panel_info:
+            ports = panel_info.get('data', {}).get('ports', [])
+            for i, port_data in enumerate(ports[:len(PORTS)]):
+                linkup = bool(port_data.get('linkup', False))
+                previous = self._linkup.get(PORTS[i])
+                self._linkup[PORTS[i]] = linkup
+                if previous is not None and previous != linkup:
+                    self._snap(f"port_cnt:{PORTS[i]}", started)
+
+    def rates(self, now=None):
+        """系列ごとの実効サンプリングレート（取得に成功した回数/秒）を返す"""
+        if now is None:
+            now = time.time()
+        span = min(self.rate_window, now - self.started)
+        rates = {}
+        for name, state in self.series.items():
+            samples = state['samples']
+            while samples and samples[0] <= now - self.rate_window:
+                samples.popleft()
+            rates[name] = round(len(samples) / span, 3) if span > 0 else 0.0
+        return rates
+
+
+def print_rates(sampler, now=None):
+    """系列ごとの実効サンプリングレートと現在の間隔を標準エラー出力に表示"""
+    rates = sampler.rates(now)
+    print("実効サンプリングレート:", file=sys.stderr)
+    print("-" * 60, file=sys.stderr)
+    for name, rate in rates.items():
+        print(f"  {name}: {rate:.3f}回/秒 (現在の間隔: {sampler.series[name]['interval']:.1f}秒)", file=sys.stderr)
+    print(f"  合計: {sum(rates.values()):.3f}回/秒", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='スイッチングハブ 適応型サンプリングスクリプト',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+取得対象の指定（省略時はすべて）:
+  --status   panel_info（ポートステータス）
+  --mac      mac_dynamic（ダイナミックMACアドレステーブル）
+  --traffic  port_cnt（ポートごとのトラフィック統計）
+
+使用例:
+  # 取得結果をJSON Linesで保存し、あとでアラートルールを評価
+  python3 %(prog)s --env-file .env.office-floor1 > samples.jsonl
+  python3 watch_elecom_swhub_alerts.py --rules alert_rules.json --replay samples.jsonl
+
+  # 60秒ごとに系列ごとの実効サンプリングレートを表示
+  python3 %(prog)s --env-file .env.office-floor1 --stats 60 > samples.jsonl
+        """
+    )
+
+    parser.add_argument('--env-file', default='.env', help='.envファイルのパス (デフォルト: .env)')
+
+    # .envファイルを読み込み
+    args_temp = parser.parse_known_args()[0]
+    env_vars = load_env_file(args_temp.env_file)
+
+    parser.add_argument('--ip', help='スイッチのIPアドレス')
+    parser.add_argument('--user', help='ユーザー名')
+    parser.add_argument('--password', help='パスワード')
+
+    parser.add_argument('--status', action='store_true', help='ポートステータスを取得')
+    parser.add_argument('--mac', action='store_true', help='MACアドレステーブルを取得')
+    parser.add_argument('--traffic', action='store_true', help='全ポートのトラフィック統計を取得')
+    parser.add_argument('--min-interval', type=float, default=1.0, help='最短ポーリング間隔（秒、デフォルト: 1）')
+    parser.add_argument('--max-interval', type=float, default=60.0, help='最長ポーリング間隔（秒、デフォルト: 60）')
+    parser.add_argument('--backoff', type=float, default=2.0, help='変化がないときの間隔の倍率（デフォルト: 2）')
+    parser.add_argument('--max-requests', type=int, help='1回の取得あたりの最大リクエスト数（1以上、デフォルト: 無制限）')
+    parser.add_argument('--stats', type=float, help='実効サンプリングレートを表示する間隔（秒）')
+
+    args = parser.parse_args()
+
+    # 設定値を優先順位に従って取得
+    switch_ip = get_config_value(args.ip, env_vars.get('SWITCH_IP'))
+    switch_user = get_config_value(args.user, env_vars.get('SWITCH_USER'))
+    switch_password = get_config_value(args.password, env_vars.get('SWITCH_PASSWORD'))
+
+    # 接続情報の検証
+    if not switch_ip or not switch_user or not switch_password:
+        parser.error('接続情報が不足しています。--ip, --user, --password を指定するか、.envファイルを設定してください。')
+
+    if (args.min_interval <= 0 or args.max_interval < args.min_interval or args.backoff < 1
+            or (args.max_requests is not None and args.max_requests < 1)):
+        parser.error('--min-interval, --max-interval, --backoff, --max-requests の指定が不正です。')
+
+    switch_url = f"http://{switch_ip}"
+    switch_name = get_switch_name(args.env_file, dict(env_vars, SWITCH_IP=switch_ip))
+
+    select_all = not (args.status or args.mac or args.traffic)
+    commands = []
+    if select_all or args.status:
+        commands.append('panel_info')
+    if select_all or args.mac:
+        commands.append('mac_dynamic')
+    ports = PORTS if select_all or args.traffic else []
+
+    sampler = AdaptiveSampler(
+        commands, ports,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        backoff=args.backoff,
+        max_requests=args.max_requests,
+    )
+    next_stats = time.time() + args.stats if args.stats else None
+
+    try:
+        while True:
+            started = now = time.time()
+            commands_to_fetch, traffic_ports = sampler.due(started)
+            if commands_to_fetch or traffic_ports:
+                result = get_switch_data_with_retry(
+                    switch_url, switch_user, switch_password, commands_to_fetch,
+                    get_all_port_traffic=bool(traffic_ports), traffic_ports=traffic_ports,
+                )
+                if 'error' in result:
+                    print(f"取得エラー: {result['error']}", file=sys.stderr)
+                now = time.time()
+                sampler.update(result, started)
+                print(json.dumps({'switch': switch_name, 'time': now, 'result': result}, ensure_ascii=False), flush=True)
+
+            if next_stats is not None and now >= next_stats:
+                print_rates(sampler, now)
+                next_stats = now + args.stats
+
+            next_due = sampler.next_due()
+            if next_due is None:
+                next_due = started + args.min_interval
+            time.sleep(max(0, next_due - time.time()))
+    except KeyboardInterrupt:
+        print_rates(sampler)
+
+
+if __name__ == "__main__":
+    main()
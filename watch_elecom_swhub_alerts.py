@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+スイッチングハブ アラート監視スクリプト
+
+get_elecom_swhub_info.py の取得処理でスイッチを定期ポーリングし、
+宣言的に記述したルールをサンプル到着ごとに差分評価してアラートを送出する。
+過去のJSONダンプを再パースすることはなく、ルールごとの状態は
+スライディングウィンドウ（deque）と既知集合のみで保持する。
+
+1回の取得ごとにログイン・ログアウトを行うため（セッション解放待ちなどで
+約3秒以上かかる）、実際のサンプリング間隔はこれより短くならない。
+取得が --interval を超えた場合は警告を表示し、続けて次の取得を行う。
+
+ルールの種類:
+  link_flap      panel_info のリンク状態変化が window 秒以内に count 回以上
+  counter_rate   port_cnt の field の増加レートが threshold（/秒）を超過
+  new_mac        mac_dynamic に未知のMACアドレスが出現
+
+使用方法:
+  python3 watch_elecom_swhub_alerts.py --rules alert_rules.json [オプション]
+
+例:
+  python3 watch_elecom_swhub_alerts.py --rules alert_rules.json --env-file .env.office-floor1
+  python3 watch_elecom_swhub_alerts.py --rules alert_rules.json \\
+      --env-file .env.office-floor1 --env-file .env.office-floor2 \\
+      --sink stdout --sink file:alerts.jsonl
+  python3 watch_elecom_swhub_alerts.py --rules alert_rules.json --env-file .env.office-floor1 --max-interval 30
+  python3 watch_elecom_swhub_alerts.py --rules alert_rules.json --replay samples.jsonl
+"""
+
+import urllib.request
+import collections
+import threading
+import queue
+import fnmatch
+import json
+import time
+import argparse
+import sys
+
+from get_elecom_swhub_info import (
+    PORTS,
+    load_env_file,
+    get_switch_name,
+    get_switch_data_with_retry,
+)
+from sample_elecom_swhub import AdaptiveSampler, SAMPLED_COMMANDS, print_rates
+
+# ルール種別ごとの入力元（取得結果のキー）
+RULE_SOURCES = {
+    'link_flap': 'panel_info',
+    'counter_rate': 'port_cnt',
+    'new_mac': 'mac_dynamic',
+}
+
+
+def _get_path(data, path):
+    """ドット区切りのパスで辞書を辿って値を取得（存在しなければNone）"""
+    for key in path.split('.'):
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and key.isdigit() and int(key) < len(data):
+            data = data[int(key)]
+        else:
+            return None
+    return data
+
+
+def _to_number(value):
+    """カウンタ値を数値に変換（数値文字列も許容、変換できなければNone）"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize_mac(mac):
+    """MACアドレスを小文字・コロン区切りに正規化"""
+    return mac.strip().lower().replace('-', ':')
+
+
+class Rule:
+    """宣言的ルールの共通部分
+
+    サブクラスは evaluate() で (アラートキー, 発火中か, 詳細) を列挙する。
+    アラートキーは重複排除に使われるため、同じ事象には同じキーを返すこと。
+    one_shot のルールは自身で重複排除するため、発火中の状態を保持しない。
+    """
+
+    one_shot = False
+
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.type = spec['type']
+        self.source = RULE_SOURCES[self.type]
+        self.switches = spec.get('switches', ['*'])
+        self.ports = spec.get('ports')
+        self.severity = spec.get('severity', 'warning')
+        # 発火中に再通知する間隔（秒）。0なら解消されるまで再通知しない
+        self.repeat = float(spec.get('repeat', 0))
+        # スイッチ・ポートごとのウィンドウ状態
+        self._state = {}
+
+    def matches_switch(self, switch):
+        return any(fnmatch.fnmatchcase(switch, pattern) for pattern in self.switches)
+
+    def matches_port(self, port):
+        return self.ports is None or port in self.ports
+
+    def evaluate(self, switch, data, now):
+        raise NotImplementedError
+
+
+class LinkFlapRule(Rule):
+    """リンク状態の変化回数をスライディングウィンドウで数える"""
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.count = int(spec['count'])
+        self.window = float(spec['window'])
+
+    def evaluate(self, switch, data, now):
+        ports = data.get('data', {}).get('ports', [])
+        for i, port_data in enumerate(ports[:len(PORTS)]):
+            port = PORTS[i]
+            if not self.matches_port(port):
+                continue
+            linkup = bool(port_data.get('linkup', False))
+            state = self._state.get((switch, port))
+            if state is None:
+                state = self._state[(switch, port)] = {'linkup': linkup, 'flaps': collections.deque()}
+            flaps = state['flaps']
+            if linkup != state['linkup']:
+                flaps.append(now)
+                state['linkup'] = linkup
+            # ウィンドウ外になった変化を先頭から捨てる
+            while flaps and flaps[0] <= now - self.window:
+                flaps.popleft()
+            yield (switch, port), len(flaps) >= self.count, {
+                'port': port,
+                'flaps': len(flaps),
+                'window': self.window,
+                'linkup': linkup,
+            }
+
+
+class CounterRateRule(Rule):
+    """port_cnt のカウンタ増加レートをスライディングウィンドウで求める"""
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.field = spec['field']
+        self.threshold = float(spec['threshold'])
+        # 0ならば直前のサンプルとの差分でレートを求める
+        self.window = float(spec.get('window', 0))
+
+    def evaluate(self, switch, data, now):
+        for port, port_data in data.items():
+            if not self.matches_port(port) or not isinstance(port_data, dict) or 'error' in port_data:
+                continue
+            value = _to_number(_get_path(port_data, self.field))
+            if value is None:
+                continue
+            samples = self._state.setdefault((switch, port), collections.deque())
+            # カウンタがリセットされた場合はウィンドウを作り直す
+            if samples and value < samples[-1][1]:
+                samples.clear()
+            samples.append((now, value))
+            if self.window > 0:
+                while len(samples) > 2 and samples[1][0] <= now - self.window:
+                    samples.popleft()
+            else:
+                while len(samples) > 2:
+                    samples.popleft()
+            if len(samples) < 2 or samples[-1][0] <= samples[0][0]:
+                continue
+            rate = (samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0])
+            yield (switch, port), rate > self.threshold, {
+                'port': port,
+                'field': self.field,
+                'rate': round(rate, 3),
+                'threshold': self.threshold,
+            }
+
+
+class NewMacRule(Rule):
+    """既知集合にないMACアドレスの出現を検知する
+
+    最初のサンプルは学習のみ行いアラートを出さない（learn=falseで無効化）。
+    テーブルから消えて forget 秒経過したMACアドレスは既知集合から外す。
+    """
+
+    one_shot = True
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.allow = {_normalize_mac(mac) for mac in spec.get('allow', [])}
+        self.learn = spec.get('learn', True)
+        self.forget = float(spec.get('forget', 86400))
+
+    def evaluate(self, switch, data, now):
+        entries = data.get('data', {}).get('entries', [])
+        # (MACアドレス, ポート) -> 最後にテーブルで見た時刻
+        known = self._state.get(switch)
+        baseline = known is None and self.learn
+        if known is None:
+            known = self._state[switch] = {}
+        for entry in entries:
+            mac = entry.get('macAddr', '')
+            port = entry.get('port', '')
+            # 最初のエントリは空なのでスキップ
+            if not mac or not self.matches_port(port):
+                continue
+            mac = _normalize_mac(mac)
+            if mac in self.allow:
+                continue
+            is_new = (mac, port) not in known
+            known[(mac, port)] = now
+            if is_new and not baseline:
+                yield (switch, port, mac), True, {
+                    'port': port,
+                    'mac': mac,
+                    'vlan': entry.get('vlan'),
+                }
+        # 長期間見ていないMACアドレスを忘れる（再出現すれば再び通知する）
+        for key in [key for key, seen in known.items() if seen <= now - self.forget]:
+            del known[key]
+
+
+RULE_TYPES = {
+    'link_flap': LinkFlapRule,
+    'counter_rate': CounterRateRule,
+    'new_mac': NewMacRule,
+}
+
+
+def load_rules(rules_file):
+    """ルールファイル（JSON）を読み込んでRuleのリストを返す"""
+    with open(rules_file, 'r') as f:
+        config = json.load(f)
+    specs = config.get('rules', []) if isinstance(config, dict) else config
+    if not isinstance(specs, list):
+        raise ValueError("ルールファイルは rules の配列を含むオブジェクト、または配列で指定してください")
+    rules = []
+    names = set()
+    for spec in specs:
+        if not isinstance(spec, dict):
+            raise ValueError(f"ルールはオブジェクトで指定してください: {spec!r}")
+        rule_type = spec.get('type')
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"未知のルール種別です: {rule_type}")
+        if not isinstance(spec.get('name'), str):
+            raise ValueError(f"ルール名(name)がありません: {spec}")
+        if spec['name'] in names:
+            raise ValueError(f"ルール名が重複しています: {spec['name']}")
+        names.add(spec['name'])
+        if 'learn' in spec and not isinstance(spec['learn'], bool):
+            raise ValueError(f"ルール {spec['name']} の learn は true/false で指定してください")
+        try:
+            rules.append(RULE_TYPES[rule_type](spec))
+        except KeyError as e:
+            raise ValueError(f"ルール {spec['name']} に必須項目 {e} がありません")
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"ルール {spec['name']} の値が不正です: {e}")
+    return rules
+
+
+class StdoutSink:
+    """アラートを標準出力に書き出す"""
+
+    def emit(self, alert):
+        print(json.dumps(alert, ensure_ascii=False), flush=True)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """アラートをJSON Lines形式でファイルに追記する"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, alert):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(alert, ensure_ascii=False) + '\n')
+
+    def close(self):
+        pass
+
+
+class WebhookSink:
+    """アラートをJSONでHTTP POSTする（ローカルの受信スクリプト等を想定）
+
+    送信は専用スレッドで行い、Webhookが応答しなくてもポーリングを止めない。
+    キューが一杯のときはアラートを捨ててエラーを表示する。
+    """
+
+    def __init__(self, url, max_queue=1000):
+        self.url = url
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._send_loop, daemon=True)
+        self._thread.start()
+
+    def emit(self, alert):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            print(f"Webhook送信キューが一杯のためアラートを破棄しました: {alert.get('rule')}", file=sys.stderr)
+
+    def _send_loop(self):
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            request = urllib.request.Request(self.url, data=json.dumps(alert).encode('utf-8'), method='POST')
+            request.add_header('Content-Type', 'application/json')
+            try:
+                with urllib.request.urlopen(request, timeout=5):
+                    pass
+            except Exception as e:
+                # 送信に失敗しても監視は継続する
+                print(f"Webhook送信エラー: {e}", file=sys.stderr)
+
+    def close(self, timeout=10):
+        """キューに残ったアラートを送信し終えるまで待つ（最大 timeout 秒）"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout=timeout)
+
+
+def build_sink(spec):
+    """--sink の指定（stdout / file:PATH / webhook:URL）からSinkを作る"""
+    kind, _, target = spec.partition(':')
+    if kind == 'stdout':
+        return StdoutSink()
+    if kind == 'file' and target:
+        return FileSink(target)
+    if kind == 'webhook' and target:
+        return WebhookSink(target)
+    raise ValueError(f"不正なsink指定です: {spec}")
+
+
+class AlertEngine:
+    """取得結果を受け取るたびにルールを差分評価し、重複排除してSinkに送る"""
+
+    def __init__(self, rules, sinks):
+        self.rules = rules
+        self.sinks = sinks
+        # スイッチ名 -> {入力元: [適用ルール]}（スイッチ名のマッチは初回のみ）
+        self._switch_rules = {}
+        # 発火中のアラートキー -> 最後に通知した時刻
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def _rules_for(self, switch):
+        index = self._switch_rules.get(switch)
+        if index is None:
+            index = collections.defaultdict(list)
+            for rule in self.rules:
+                if rule.matches_switch(switch):
+                    index[rule.source].append(rule)
+            self._switch_rules[switch] = index
+        return index
+
+    def required_sources(self, switch):
+        """スイッチに適用されるルールの評価に必要な入力元の集合"""
+        with self._lock:
+            return {source for source, rules in self._rules_for(switch).items() if rules}
+
+    def traffic_ports(self, switch):
+        """スイッチに適用される counter_rate ルールが参照するポート一覧"""
+        ports = set()
+        with self._lock:
+            for rule in self._rules_for(switch).get('port_cnt', []):
+                ports.update(PORTS if rule.ports is None else rule.ports)
+        return [port for port in PORTS if port in ports]
+
+    def _make_alert(self, rule, switch, detail, now):
+        alert = {
+            'time': now,
+            'switch': switch,
+            'rule': rule.name,
+            'type': rule.type,
+            'severity': rule.severity,
+        }
+        alert.update(detail)
+        return alert
+
+    def process(self, switch, result, now=None):
+        """1サンプル分の取得結果を評価し、送出したアラートのリストを返す"""
+        if now is None:
+            now = time.time()
+        inputs = {
+            'panel_info': result.get('panel_info'),
+            'port_cnt': result.get('port_traffic_all'),
+            'mac_dynamic': result.get('mac_dynamic'),
+        }
+        fired = []
+        with self._lock:
+            for source, rules in self._rules_for(switch).items():
+                data = inputs.get(source)
+                # 今回取得していない、またはエラーの入力元は評価しない
+                if not isinstance(data, dict) or 'error' in data:
+                    continue
+                for rule in rules:
+                    for key, active, detail in rule.evaluate(switch, data, now):
+                        alert_key = (rule.name,) + key
+                        if rule.one_shot:
+                            # ルール側で重複排除済みのため、発火中として保持しない
+                            if active:
+                                fired.append(self._make_alert(rule, switch, detail, now))
+                            continue
+                        if not active:
+                            # 解消したら再度発火できるようにする
+                            self._active.pop(alert_key, None)
+                            continue
+                        last = self._active.get(alert_key)
+                        if last is not None and (rule.repeat <= 0 or now - last < rule.repeat):
+                            continue
+                        self._active[alert_key] = now
+                        fired.append(self._make_alert(rule, switch, detail, now))
+        for alert in fired:
+            for sink in self.sinks:
+                sink.emit(alert)
+        return fired
+
+
+def poll_switch(engine, name, switch_url, username, password, interval, stop_event, max_interval=None):
+    """1台のスイッチを interval 秒ごとにポーリングしてエンジンに渡す
+
+    max_interval を指定した場合は AdaptiveSampler で系列ごとに間隔を調整し、
+    変化のない系列は最長 max_interval 秒まで間隔を延ばす。
+    """
+    sources = engine.required_sources(name)
+    commands = [cmd for cmd in SAMPLED_COMMANDS if cmd in sources]
+    ports = engine.traffic_ports(name)
+    if not commands and not ports:
+        # 適用されるルールがないスイッチにはアクセスしない
+        print(f"[{name}] 適用されるルールがないため監視しません", file=sys.stderr)
+        return
+    sampler = None
+    if max_interval:
+        sampler = AdaptiveSampler(commands, ports, min_interval=interval, max_interval=max_interval)
+
+    warned = False
+    while not stop_event.is_set():
+        started = time.time()
+        commands_to_fetch, traffic_ports = sampler.due(started) if sampler else (commands, ports)
+        if commands_to_fetch or traffic_ports:
+            result = get_switch_data_with_retry(
+                switch_url, username, password, commands_to_fetch,
+                get_all_port_traffic=bool(traffic_ports), traffic_ports=traffic_ports,
+            )
+            if 'error' in result:
+                print(f"[{name}] 取得エラー: {result['error']}", file=sys.stderr)
+            now = time.time()
+            if now - started > interval and not warned:
+                print(f"[{name}] 取得に{now - started:.1f}秒かかり、ポーリング間隔（{interval}秒）を超えています"
+                      "（ログイン・ログアウトを含むため1回の取得に約3秒以上かかります）", file=sys.stderr)
+                warned = True
+            if sampler:
+                sampler.update(result, started)
+            engine.process(name, result, now)
+        next_due = sampler.next_due() if sampler else None
+        if next_due is None:
+            next_due = started + interval
+        stop_event.wait(max(0, next_due - time.time()))
+
+    if sampler:
+        print(f"[{name}]", file=sys.stderr)
+        print_rates(sampler)
+
+
+def replay(engine, replay_file, replay_interval=None):
+    """記録済みの取得結果（JSON Lines）をエンジンに流す
+
+    各行は {"switch": 名前, "time": UNIX時刻, "result": 出力} の形式、または
+    get_elecom_swhub_info.py の出力そのものとする。time のない行は
+    replay_interval 秒間隔で取得したものとして扱い、指定がなければエラーにする
+    （再生時の現在時刻を使うとレートやウィンドウが意味をなさないため）。
+    """
+    # スイッチごとの time のないサンプル数
+    untimed = collections.Counter()
+    with open(replay_file, 'r') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if 'result' in record:
+                switch, result, now = record.get('switch', 'switch'), record['result'], record.get('time')
+            else:
+                switch, result, now = 'switch', record, None
+            if now is None:
+                if not replay_interval:
+                    raise ValueError(f"{replay_file} {line_no}行目: time がありません（--replay-interval を指定してください）")
+                now = untimed[switch] * replay_interval
+                untimed[switch] += 1
+            engine.process(switch, result, now)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='スイッチングハブ アラート監視スクリプト',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+ルールファイル (JSON) の例:
+  {"rules": [
+    {"name": "ge3-flap", "type": "link_flap", "ports": ["GE3"], "count": 5, "window": 600},
+    {"name": "rx-error-rate", "type": "counter_rate", "field": "data.rxErr",
+     "threshold": 1, "window": 60},
+    {"name": "unknown-mac", "type": "new_mac", "ports": ["GE1", "GE2"],
+     "allow": ["00:11:22:33:44:55"]}
+  ]}
+
+共通項目:
+  switches  対象スイッチ名のパターン（fnmatch形式、デフォルト: ["*"]）
+  ports     対象ポート（省略時は全ポート）
+  severity  重要度（デフォルト: warning）
+  repeat    発火中の再通知間隔（秒、デフォルト: 0 = 解消まで再通知しない）
+
+new_mac の項目:
+  allow     通知しないMACアドレス
+  learn     最初の取得分は学習のみ行う（true/false、デフォルト: true）
+  forget    テーブルから消えたMACアドレスを忘れるまでの秒数（デフォルト: 86400）
+
+スイッチ名は.envファイルの SWITCH_NAME、なければファイル名から決まります
+（.env.office-floor1 -> office-floor1）。
+
+使用例:
+  python3 %(prog)s --rules alert_rules.json --env-file .env.office-floor1
+  python3 %(prog)s --rules alert_rules.json --env-file .env.office-floor1 \\
+      --env-file .env.office-floor2 --sink file:alerts.jsonl
+  python3 %(prog)s --rules alert_rules.json --replay samples.jsonl
+        """
+    )
+
+    parser.add_argument('--rules', required=True, help='ルールファイル（JSON）のパス')
+    parser.add_argument('--env-file', action='append', help='.envファイルのパス（複数指定可、デフォルト: .env）')
+    parser.add_argument('--interval', type=float, default=5.0, help='ポーリング間隔（秒、デフォルト: 5、1回の取得に約3秒以上かかる）')
+    parser.add_argument('--max-interval', type=float, help='指定すると変化のない系列の間隔をこの秒数まで延ばす（適応型サンプリング）')
+    parser.add_argument('--sink', action='append', help='アラート送出先 stdout / file:PATH / webhook:URL（複数指定可、デフォルト: stdout）')
+    parser.add_argument('--replay', help='記録済みの取得結果（JSON Lines）を評価して終了')
+    parser.add_argument('--replay-interval', type=float, help='--replay で time のない行を何秒間隔の取得として扱うか')
+
+    args = parser.parse_args()
+
+    if args.interval <= 0 or (args.max_interval is not None and args.max_interval < args.interval):
+        parser.error('--interval, --max-interval の指定が不正です（--max-interval は --interval 以上）。')
+
+    try:
+        rules = load_rules(args.rules)
+        sinks = [build_sink(spec) for spec in (args.sink or ['stdout'])]
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    engine = AlertEngine(rules, sinks)
+
+    if args.replay:
+        try:
+            replay(engine, args.replay, args.replay_interval)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        finally:
+            for sink in sinks:
+                sink.close()
+        return
+
+    # スイッチごとの接続情報を読み込む
+    switches = []
+    for env_file in args.env_file or ['.env']:
+        env_vars = load_env_file(env_file)
+        if not env_vars.get('SWITCH_IP') or not env_vars.get('SWITCH_USER') or not env_vars.get('SWITCH_PASSWORD'):
+            parser.error(f'接続情報が不足しています: {env_file}')
+        name = get_switch_name(env_file, env_vars)
+        switches.append((name, f"http://{env_vars['SWITCH_IP']}", env_vars['SWITCH_USER'], env_vars['SWITCH_PASSWORD']))
+
+    # スイッチごとに1スレッドでポーリング（各スイッチは1セッションのみ）
+    stop_event = threading.Event()
+    threads = []
+    for name, switch_url, username, password in switches:
+        thread = threading.Thread(
+            target=poll_switch,
+            args=(engine, name, switch_url, username, password, args.interval, stop_event, args.max_interval),
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=5)
+    for sink in sinks:
+        sink.close()
+
+
+if __name__ == "__main__":
+    main()